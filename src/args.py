@@ -25,6 +25,12 @@ def parse_args():
         default="ffmpeg",
         help="Path to ffmpeg executable (default: ffmpeg in PATH)",
     )
+    parser.add_argument(
+        "--ffmpeg-jobs",
+        type=int,
+        default=config.ffmpeg_concurrency,
+        help=f"Number of concurrent ffmpeg overlay merges (default: {config.ffmpeg_concurrency}, half the CPU cores)",
+    )
     parser.add_argument(
         "-c",
         "--concurrent",
@@ -88,6 +94,7 @@ def setup_config():
 
     # Apply all args to config
     config.ffmpeg_path = args.ffmpeg_path
+    config.ffmpeg_concurrency = args.ffmpeg_jobs
     config.overlay_mode = OverlayMode(args.overlay)
     config.overlay_naming = OverlayNaming(args.overlay_naming)
     config.output_dir = Path(args.output)
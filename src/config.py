@@ -1,5 +1,6 @@
 """Global configuration and defaults for Snapchat memories downloader."""
 
+import os
 from enum import Enum
 from pathlib import Path
 
@@ -20,6 +21,8 @@ class OverlayNaming(Enum):
 # FFmpeg configuration
 ffmpeg_path: str = "ffmpeg"
 ffmpeg_available: bool = False
+# Maximum number of overlay merges ffmpeg runs at the same time
+ffmpeg_concurrency: int = max(1, (os.cpu_count() or 2) // 2)
 
 # Overlay settings
 overlay_mode: OverlayMode = OverlayMode.NONE
@@ -29,6 +32,9 @@ overlay_naming: OverlayNaming = OverlayNaming.SEPARATE_FOLDERS
 WITH_OVERLAYS_DIR: str = "with_overlays"
 WITHOUT_OVERLAYS_DIR: str = "without_overlays"
 
+# Scratch directory shared by all merges in a run (None: system temp dir)
+tmp_root: Path | None = None
+
 # Output settings
 output_dir: Path = Path("./downloads")
 filename_prefix: str = ""
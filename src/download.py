@@ -15,10 +15,11 @@ from .metadata import apply_metadata_and_timestamps
 from .zip_processor import process_zip_with_overlays
 
 
-def _build_existing_files_set(output_dir: Path) -> set[str]:
+def build_existing_files_set(output_dir: Path) -> set[str]:
     """Build a set of existing file base names in the output directory tree.
     
     Scans the directory once and extracts base names (without extension and overlay suffix).
+    Safe to run in a worker thread (e.g. while the memories JSON is still being parsed).
     """
     existing_files = set()
     if output_dir.exists():
@@ -30,10 +31,13 @@ def _build_existing_files_set(output_dir: Path) -> set[str]:
     return existing_files
 
 
-def _filter_memories_to_download(memories: list[Memory], stats: Stats) -> list[Memory]:
+def _filter_memories_to_download(
+    memories: list[Memory], stats: Stats, existing_files: set[str] | None = None
+) -> list[Memory]:
     """Filter memories based on skip_existing setting. Updates skipped count in stats.
     
-    Shows progress bar while scanning for existing files.
+    Uses a precomputed `existing_files` set when given, otherwise scans the output directory.
+    Shows progress bar while checking memories against existing files.
     """
     to_download = []
     
@@ -41,9 +45,11 @@ def _filter_memories_to_download(memories: list[Memory], stats: Stats) -> list[M
         # If not skipping existing, all memories are downloaded
         return memories
     
-    print("Scanning for existing files...")
-    # Build set of existing files once (O(M) where M = number of existing files)
-    existing_files = _build_existing_files_set(config.output_dir)
+    # Build set of existing files once (O(M) where M = number of existing files),
+    # unless the caller already scanned the output folder
+    if existing_files is None:
+        print("Scanning for existing files...")
+        existing_files = build_existing_files_set(config.output_dir)
     
     # Check each memory against the set (O(N) where N = number of memories)
     for memory in tqdm(memories, desc="Scanning", unit="file"):
@@ -127,8 +133,9 @@ async def download_memory(
                     await process_zip_with_overlays(config.output_dir, content, memory, stats)
 
                 bytes_downloaded = len(content)
-                # Apply metadata and timestamps
-                apply_metadata_and_timestamps(memory)
+                # Apply metadata and timestamps in a worker thread: ffmpeg/exiftool/piexif
+                # calls are blocking and would otherwise stall every other download
+                await asyncio.to_thread(apply_metadata_and_timestamps, memory)
 
                 # Always return success + byte count
                 return True, bytes_downloaded
@@ -140,6 +147,7 @@ async def download_memory(
 
 async def download_all(
     memories: list[Memory],
+    existing_files: set[str] | None = None,
 ) -> None:
     config.output_dir.mkdir(parents=True, exist_ok=True)
     # Create overlay folders if using 'both' mode with 'separate-folders' naming
@@ -158,7 +166,7 @@ async def download_all(
     start_time = time.time()
 
     # Filter memories to download
-    to_download = _filter_memories_to_download(memories, stats)
+    to_download = _filter_memories_to_download(memories, stats, existing_files)
 
     if not to_download:
         print("All files already downloaded!")
@@ -1,30 +1,38 @@
 import asyncio
+import atexit
 import json
+import shutil
+import tempfile
+from datetime import datetime
 from pathlib import Path
 import os
 
-from . import config
+from pydantic_core import from_json
+
+from . import config, ocr_batcher
+from .config import OverlayMode
 from . import args as args_module
-from .memory import Memory
+from .memory import Memory, close_shared_client
 from .ffmpeg import check_ffmpeg
-from .download import download_all
+from .download import build_existing_files_set, download_all
 
 
 
 
 def load_memories(json_path: Path) -> tuple[dict, list[Memory]]:
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    # pydantic-core's Rust JSON parser is roughly 2x faster than json.load on large exports
+    data = from_json(json_path.read_bytes())
 
     raw_memories = data.get("Saved Media", [])
 
     # Single-pass: keep a pointer to last seen memory per timestamp
-    last_by_key: dict[str, Memory] = {}
+    last_by_key: dict[str | datetime, Memory] = {}
     memories: list[Memory] = []
     for item in raw_memories:
-        memory = Memory(**item)
-        # Prefer original 'Date' string when present, else snake_case, else parsed datetime string
-        key = item.get("Date") or item.get("date") or str(memory.date)
+        # Rows come straight from Snapchat's export, so skip per-row Pydantic validation
+        memory = Memory.from_export_dict(item)
+        # Prefer original 'Date' string when present, else snake_case, else the parsed datetime itself
+        key = item.get("Date") or item.get("date") or memory.date
 
         if key in last_by_key:
             prev = last_by_key[key]
@@ -61,8 +69,8 @@ def save_processed_memories(json_path: Path, original_data: dict, memories: list
     # Create output filename: memories_history.json -> memories_history_processed.json
     out_path = json_path.parent / (json_path.stem + "_processed.json")
     
-    # Ensure Pydantic applies json encoders (e.g., datetime -> UTC string)
-    items = [m.model_dump(by_alias=True, mode="json") for m in memories]
+    # Build export rows directly (datetime -> UTC string) instead of a full model_dump per memory
+    items = [m.to_export_dict() for m in memories]
     out_data = dict(original_data)
     out_data["Saved Media"] = items
     _atomic_write_json(out_path, out_data)
@@ -79,8 +87,25 @@ async def main():
     if not check_ffmpeg(config.ffmpeg_path, config.overlay_mode):
         return
 
+    # One scratch directory for the whole run instead of one per merged memory
+    if config.overlay_mode != OverlayMode.NONE:
+        config.tmp_root = Path(tempfile.mkdtemp(prefix="snap_"))
+        atexit.register(shutil.rmtree, config.tmp_root, ignore_errors=True)
+
+    # Scan the output folder for existing files in a worker thread while the JSON is parsed
+    existing_scan = None
+    if config.skip_existing:
+        existing_scan = asyncio.get_running_loop().run_in_executor(
+            None, build_existing_files_set, config.output_dir
+        )
+
     original_data, memories = load_memories(json_path)
-    await download_all(memories)
+    existing_files = await existing_scan if existing_scan is not None else None
+    try:
+        await download_all(memories, existing_files)
+    finally:
+        await close_shared_client()
+        await ocr_batcher.close()
     # Save processed memories (includes OCR if enabled, plus any other processing)
     save_processed_memories(json_path, original_data, memories)
 
@@ -1,25 +1,75 @@
 """Data models for Snapchat memories."""
 
+import logging
 import re
 from enum import Enum
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import ClassVar, Optional
+from zoneinfo import ZoneInfo
 
 import httpx
-from pydantic import BaseModel, Field, field_validator, model_validator
-from pydantic import ConfigDict
+from pydantic import BaseModel, Field, PrivateAttr, field_serializer, field_validator, model_validator
 from timezonefinder import TimezoneFinder
-import pytz
 
 from . import config
 from .config import OverlayMode
 
+logger = logging.getLogger(__name__)
+
 # Module-level singleton for TimezoneFinder (initialized once for performance)
 # TimezoneFinder loads timezone boundary data which is slow, so we reuse one instance
 _timezone_finder_instance = TimezoneFinder()
 
 
+@lru_cache(maxsize=4096)
+def _tz_name_for_cell(lat_q: int, lng_q: int) -> Optional[str]:
+    """Return the timezone name for a ~111 m GPS cell (coordinates quantized to 3 decimals).
+    
+    Consecutive memories are usually taken in the same place, so caching per cell
+    skips most of TimezoneFinder's point-in-polygon lookups.
+    """
+    return _timezone_finder_instance.timezone_at(lat=lat_q / 1000, lng=lng_q / 1000)
+
+
+@lru_cache(maxsize=None)
+def _get_tz(tz_name: str) -> ZoneInfo:
+    """Return a cached ZoneInfo for an IANA timezone name (memories cluster in few zones)."""
+    return ZoneInfo(tz_name)
+
+
+# Shared client for Snapchat endpoint POSTs, created lazily so CLI config is applied first
+_shared_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Return the shared AsyncClient so keep-alive connections are reused across memories."""
+    global _shared_async_client
+    if _shared_async_client is None:
+        _shared_async_client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(
+                max_connections=config.max_concurrent,
+                max_keepalive_connections=config.max_concurrent,
+            ),
+        )
+    return _shared_async_client
+
+
+async def close_shared_client() -> None:
+    """Close the shared AsyncClient once all downloads are finished."""
+    global _shared_async_client
+    if _shared_async_client is not None:
+        await _shared_async_client.aclose()
+        _shared_async_client = None
+
+
+# Input keys that may carry the "lat, lon" location string
+_LOCATION_KEYS = frozenset(("Location", "location"))
+_LOCATION_RE = re.compile(r"([-\d.]+),\s*([-\d.]+)")
+
+
 class MediaType(str, Enum):
     """Enum for supported media types."""
     IMAGE = "image"
@@ -34,10 +84,6 @@ class MediaType(str, Enum):
 
 
 class Memory(BaseModel):
-    # Ensure all datetimes serialize back to Snapchat JSON string format
-    model_config = ConfigDict(json_encoders={
-        datetime: lambda dt: dt.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-    })
     """Model for a single memory from Snapchat export."""
     date: datetime = Field(validation_alias="Date")
     media_type: MediaType = Field(validation_alias="Media Type")
@@ -48,45 +94,64 @@ class Memory(BaseModel):
     location_available: bool = Field(default=False, exclude=True)  # True if lat/lon are valid coordinates
     path_with_overlay: Optional[Path] = Field(default=None, exclude=True)
     path_without_overlay: Optional[Path] = Field(default=None, exclude=True)
+    overlay_reencoded: bool = Field(default=False, exclude=True)  # True if path_with_overlay was re-encoded by PIL (no EXIF left)
     extracted_ocr_text: Optional[str] = Field(default=None)
     manual_location: bool = Field(default=False)
     occurrence: int = Field(default=1, exclude=True)  # Which occurrence of this timestamp (1-based, for handling duplicates)
     timezone: Optional[str] = Field(default=None, exclude=False, description="IANA timezone name where the memory was captured (e.g., 'America/New_York')")
 
-    # Per-field serializer is unnecessary because model_config.json_encoders
-    # already formats all datetime values uniformly.
+    # UTC timestamp part of every filename, computed once in model_post_init
+    _base_name: str = PrivateAttr(default="")
+    # get_filename results keyed by (has_overlay, occurrence)
+    _filename_cache: dict[tuple[bool, int], str] = PrivateAttr(default_factory=dict)
+
+    # (field_name, validation_alias) pairs, discovered once per class on first validation
+    _alias_pairs: ClassVar[Optional[tuple[tuple[str, str], ...]]] = None
+
+    @field_serializer("date", when_used="json")
+    def serialize_date(self, dt: datetime) -> str:
+        """Serialize date back to Snapchat JSON string format (always UTC)."""
+        return dt.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
 
     @model_validator(mode="before")
     @classmethod
     def normalize_field_names(cls, data):
         """Accept either validation_alias or field name by auto-discovering aliases from field definitions.
         
-        For any field with a validation_alias, if the field name doesn't exist in data,
-        copy from the alias. Also ensure the alias key exists when only the field name
-        is provided, so validation succeeds. Parse Location string into latitude/longitude.
+        For any field with a validation_alias, ensure the alias key exists when only the
+        field name is provided, so validation succeeds. Parse Location string into
+        latitude/longitude. The input dict is only copied when one of these changes applies.
         """
         if not isinstance(data, dict):
             return data
         
-        normalized = dict(data)
+        # Alias→field mapping is static, so discover it from model fields only once
+        alias_pairs = cls.__dict__.get("_alias_pairs")
+        if alias_pairs is None:
+            alias_pairs = tuple(
+                (field_name, field_info.validation_alias)
+                for field_name, field_info in cls.model_fields.items()
+                if field_info.validation_alias
+            )
+            cls._alias_pairs = alias_pairs
         
-        # Dynamically build alias→field mapping from model fields
-        for field_name, field_info in cls.model_fields.items():
-            if field_info.validation_alias:
-                alias = field_info.validation_alias
-                # If field name not present but alias is, copy alias value to field name (do not remove alias)
-                if field_name not in normalized and alias in normalized:
-                    normalized[field_name] = normalized[alias]
-                # If alias key not present but field name is, copy field value to alias so validation finds it
-                if alias not in normalized and field_name in normalized:
-                    normalized[alias] = normalized[field_name]
+        # Aliases missing while the field name is present (e.g. re-loading a processed export)
+        missing_aliases = [(field_name, alias) for field_name, alias in alias_pairs if alias not in data and field_name in data]
+        if not missing_aliases and _LOCATION_KEYS.isdisjoint(data):
+            return data
+        
+        normalized = dict(data)
+        for field_name, alias in missing_aliases:
+            # Copy field value to alias so validation finds it
+            normalized[alias] = normalized[field_name]
         
         # Parse Location string into latitude/longitude if present
-        location_str = normalized.pop("Location", None) or normalized.pop("location", None)
-        if location_str and not normalized.get("latitude"):
-            if match := re.search(r"([-\d.]+),\s*([-\d.]+)", location_str):
-                normalized["latitude"] = float(match.group(1))
-                normalized["longitude"] = float(match.group(2))
+        if not _LOCATION_KEYS.isdisjoint(normalized):
+            location_str = normalized.pop("Location", None) or normalized.pop("location", None)
+            if location_str and not normalized.get("latitude"):
+                if match := _LOCATION_RE.search(location_str):
+                    normalized["latitude"] = float(match.group(1))
+                    normalized["longitude"] = float(match.group(2))
         
         return normalized
 
@@ -95,7 +160,11 @@ class Memory(BaseModel):
     def parse_date(cls, v):
         if isinstance(v, str):
             # Parse from UTC (Snapchat JSON is always UTC)
-            dt = datetime.strptime(v, "%Y-%m-%d %H:%M:%S UTC")
+            # fromisoformat is C-implemented and much faster than strptime
+            if v.endswith(" UTC"):
+                dt = datetime.fromisoformat(v[:-4])
+            else:
+                dt = datetime.strptime(v, "%Y-%m-%d %H:%M:%S UTC")
             dt = dt.replace(tzinfo=timezone.utc)
             # Keep as UTC - don't convert to local timezone
             return dt
@@ -110,6 +179,42 @@ class Memory(BaseModel):
             return MediaType(normalized)
         return v
 
+    @classmethod
+    def from_export_dict(cls, data: dict) -> "Memory":
+        """Build a Memory from a trusted memories_history.json row without Pydantic validation.
+        
+        Applies the same normalization as `normalize_field_names`, `parse_date` and
+        `parse_media_type` with plain dict lookups, then uses `model_construct`
+        (which still runs `model_post_init`). Accepts both Snapchat aliases and
+        field names, so processed exports can be loaded too.
+        """
+        date = data.get("Date", data.get("date"))
+        media_type = data.get("Media Type", data.get("media_type"))
+        media_download_url = data.get("Media Download Url", data.get("media_download_url"))
+        if date is None or media_type is None or media_download_url is None:
+            raise ValueError(f"Memory is missing Date, Media Type or Media Download Url: {data}")
+        
+        latitude = data.get("latitude")
+        longitude = data.get("longitude")
+        # Parse Location string into latitude/longitude if present
+        location_str = data.get("Location") or data.get("location")
+        if location_str and not latitude:
+            if match := _LOCATION_RE.search(location_str):
+                latitude = float(match.group(1))
+                longitude = float(match.group(2))
+        
+        return cls.model_construct(
+            date=cls.parse_date(date),
+            media_type=cls.parse_media_type(media_type),
+            media_download_url=media_download_url,
+            download_link=data.get("Download Link", data.get("download_link", "")),
+            latitude=latitude,
+            longitude=longitude,
+            extracted_ocr_text=data.get("extracted_ocr_text"),
+            manual_location=data.get("manual_location", False),
+            timezone=data.get("timezone"),
+        )
+
     def model_post_init(self, __context):
         # Check if location data is valid (not 0.0, 0.0 null values)
         if self.latitude is not None and self.longitude is not None:
@@ -117,18 +222,29 @@ class Memory(BaseModel):
         else:
             self.location_available = False
         
+        # Always format filenames using UTC to ensure stable, timezone-independent names
+        self._base_name = self.date.astimezone(timezone.utc).strftime('%Y-%m-%d_%H-%M-%S')
+        
         # Apply timezone awareness based on location
         self.apply_timezone_to_date()
     
-    def model_dump(self, **kwargs):
-        """Override model_dump to exclude Location field when latitude/longitude are present."""
-        data = super().model_dump(**kwargs)
-        
-        # If we have latitude/longitude, don't export the Location string field
-        if self.latitude is not None and self.longitude is not None:
-            data.pop("Location", None)
+    def to_export_dict(self) -> dict:
+        """Build the exported JSON row directly, skipping Pydantic's serializer walk.
         
-        return data
+        Produces the same output as `model_dump(by_alias=True, mode="json")`;
+        keep in sync when adding exported fields.
+        """
+        return {
+            "date": self.serialize_date(self.date),
+            "media_type": self.media_type.value,
+            "media_download_url": self.media_download_url,
+            "download_link": self.download_link,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "extracted_ocr_text": self.extracted_ocr_text,
+            "manual_location": self.manual_location,
+            "timezone": self.timezone,
+        }
 
     def get_filename(self, has_overlay: bool = False, occurrence: int = 1) -> str:
         """Get filename based on UTC timestamp, with optional overlay suffix.
@@ -138,15 +254,18 @@ class Memory(BaseModel):
             occurrence: Which occurrence of this timestamp (1-based).
                        Suffix is added only for duplicates (occurrence >= 1).
         """
+        # Filenames are looked up repeatedly (skip scan, download, merge, error paths)
+        key = (has_overlay, occurrence)
+        if (filename := self._filename_cache.get(key)) is not None:
+            return filename
         ext = ".jpg" if self.media_type == MediaType.IMAGE else ".mp4"
-        # Always format filename using UTC to ensure stable, timezone-independent names
-        dt_utc = self.date.astimezone(timezone.utc)
-        base_name = dt_utc.strftime('%Y-%m-%d_%H-%M-%S')
         # Add version suffix for duplicates (timestamps with multiple entries)
         version_suffix = f"_v{occurrence}" if occurrence >= 1 else ""
         overlay_suffix = "_overlayed" if has_overlay else ""
         prefix = f"{config.filename_prefix}_" if config.filename_prefix else ""
-        return f"{prefix}{base_name}{version_suffix}{overlay_suffix}{ext}"
+        filename = f"{prefix}{self._base_name}{version_suffix}{overlay_suffix}{ext}"
+        self._filename_cache[key] = filename
+        return filename
 
     def get_overlay_filename(self, occurrence: int = 1) -> str:
         """Get filename for the overlay file (WebP), based on UTC timestamp.
@@ -155,11 +274,9 @@ class Memory(BaseModel):
             occurrence: Which occurrence of this timestamp (1-based).
                        Suffix is added only for duplicates (occurrence >= 1).
         """
-        dt_utc = self.date.astimezone(timezone.utc)
-        base_name = dt_utc.strftime('%Y-%m-%d_%H-%M-%S')
         version_suffix = f"_v{occurrence}" if occurrence >= 1 else ""
         prefix = f"{config.filename_prefix}_" if config.filename_prefix else ""
-        return f"{prefix}{base_name}{version_suffix}_overlay.webp"
+        return f"{prefix}{self._base_name}{version_suffix}_overlay.webp"
 
     def get_media_download_url(self) -> str:
         """Get direct AWS CDN URL for media with overlays (ZIP format)."""
@@ -167,13 +284,13 @@ class Memory(BaseModel):
 
     async def get_cdn_url(self) -> str:
         """POST to Snapchat endpoint to get AWS CDN URL for media without overlays."""
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                self.download_link,
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
-            response.raise_for_status()
-            return response.text.strip()
+        client = _get_async_client()
+        response = await client.post(
+            self.download_link,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        response.raise_for_status()
+        return response.text.strip()
 
     def apply_timezone_to_date(self) -> None:
         """Apply timezone awareness to the date based on GPS location.
@@ -189,14 +306,18 @@ class Memory(BaseModel):
         if not self.location_available:
             return
         
+        # Out-of-range coordinates would make TimezoneFinder raise; check up front instead
+        if not (-90 <= self.latitude <= 90 and -180 <= self.longitude <= 180):
+            return
+        
         try:
-            tz_name = _timezone_finder_instance.timezone_at(lat=self.latitude, lng=self.longitude)
+            tz_name = _tz_name_for_cell(round(self.latitude * 1000), round(self.longitude * 1000))
             
             if not tz_name:
                 return
             
             # Get timezone object
-            tz = pytz.timezone(tz_name)
+            tz = _get_tz(tz_name)
             
             # Convert UTC datetime to local timezone (with DST applied automatically)
             local_dt = self.date.astimezone(tz)
@@ -208,7 +329,7 @@ class Memory(BaseModel):
             self.timezone = tz_name
         
         except Exception as e:
-            print(f"Failed to apply timezone for ({self.latitude}, {self.longitude}): {e}")
+            logger.warning("Failed to apply timezone for (%s, %s): %s", self.latitude, self.longitude, e)
 
     def fix_paths_on_merge_failure(self, overlay_mode: OverlayMode) -> None:
         """Fix memory file paths when overlay merge fails.
@@ -1,36 +1,49 @@
 """Metadata and timestamp handling for media files."""
 
+import logging
 import os
 import subprocess
 import piexif
 from pathlib import Path
-from datetime import timezone
+from datetime import timedelta, timezone
+from functools import lru_cache
 import shutil
 
 from . import config
 from .memory import Memory, MediaType
 
+logger = logging.getLogger(__name__)
 
-def _to_deg(value):
-    """Convert decimal degrees to (deg, min, sec)."""
-    d = int(abs(value))
-    m_float = (abs(value) - d) * 60
+
+def _gps_rational(value: float) -> list[tuple[int, int]]:
+    """Convert decimal degrees to EXIF rational format [(deg, 1), (min, 1), (sec*100, 100)]."""
+    abs_value = abs(value)
+    d = int(abs_value)
+    m_float = (abs_value - d) * 60
     m = int(m_float)
     s = round((m_float - m) * 60, 6)
-    return d, m, s
+    return [(d, 1), (m, 1), (int(s * 100), 100)]
+
 
+# Application source tags (must be bytes in piexif)
+_SOURCE_TAGS = {
+    # Software: Identifies the app that created/processed the image
+    piexif.ImageIFD.Software: b"Snapchat",
+    # Make: Camera device manufacturer/app
+    piexif.ImageIFD.Make: b"Snapchat",
+}
 
-def _deg_to_rational(dms):
-    """Convert (deg, min, sec) tuple to EXIF rational format."""
-    d, m, s = dms
-    return [
-        (int(d), 1),
-        (int(m), 1),
-        (int(s * 100), 100)
-    ]
 
+@lru_cache(maxsize=None)
+def _format_utc_offset(utc_offset: timedelta) -> str:
+    """Format a UTC offset as EXIF 2.31 ±HH:MM (memories from one timezone share the result)."""
+    offset_total_minutes = utc_offset.total_seconds() / 60
+    sign = '+' if offset_total_minutes >= 0 else '-'
+    abs_min = int(abs(offset_total_minutes))
+    return f"{sign}{abs_min // 60:02d}:{abs_min % 60:02d}"
 
-def add_exif_data(image_path: Path, memory: Memory):
+
+def add_exif_data(image_path: Path, memory: Memory, has_prior_exif: bool = True):
     """Add EXIF metadata to an image file.
 
     Embeds the following EXIF data into the image:
@@ -45,16 +58,20 @@ def add_exif_data(image_path: Path, memory: Memory):
     Args:
         image_path: Path to the image file to modify
         memory: Memory containing date (tz-aware), and optional latitude/longitude
+        has_prior_exif: False when the file is known to carry no EXIF (e.g. re-encoded
+            by PIL), which skips parsing it with piexif.load
 
     Gracefully handles missing EXIF by creating a new structure when needed. Errors during
     EXIF embedding are logged but do not stop the download process.
     """
     try:
         # Load existing EXIF if any
-        try:
-            exif_dict = piexif.load(str(image_path))
-        except Exception:
-            exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
+        exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
+        if has_prior_exif:
+            try:
+                exif_dict = piexif.load(str(image_path))
+            except Exception:
+                pass
 
         # Date/time in local timezone (memory.date is already timezone-aware)
         # EXIF classic DateTime fields don't store timezone info, so we use local time
@@ -68,14 +85,9 @@ def add_exif_data(image_path: Path, memory: Memory):
         exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = dt_str
         
         # Add EXIF 2.31 timezone offset fields if available
-        try:
-            offset_total_minutes = dt_local.utcoffset().total_seconds() / 60 if dt_local.utcoffset() else None
-        except Exception:
-            offset_total_minutes = None
-        if offset_total_minutes is not None:
-            sign = '+' if offset_total_minutes >= 0 else '-'
-            abs_min = int(abs(offset_total_minutes))
-            offset_str = f"{sign}{abs_min // 60:02d}:{abs_min % 60:02d}"
+        utc_offset = dt_local.utcoffset()
+        if utc_offset:
+            offset_str = _format_utc_offset(utc_offset)
             # OffsetTime (for DateTime), OffsetTimeOriginal, OffsetTimeDigitized
             exif_dict["Exif"][piexif.ExifIFD.OffsetTime] = offset_str
             exif_dict["Exif"][piexif.ExifIFD.OffsetTimeOriginal] = offset_str
@@ -83,11 +95,8 @@ def add_exif_data(image_path: Path, memory: Memory):
 
         # Set GPSDateStamp/GPSTimeStamp in UTC when GPS available later
 
-        # Add application source (Snapchat) - must be bytes
-        # Software: Identifies the app that created/processed the image
-        exif_dict["0th"][piexif.ImageIFD.Software] = b"Snapchat"
-        # Make: Camera device manufacturer/app
-        exif_dict["0th"][piexif.ImageIFD.Make] = b"Snapchat"
+        # Add application source (Snapchat) - Software and Make tags, same for every image
+        exif_dict["0th"].update(_SOURCE_TAGS)
 
         # If we have overlay OCR text, store it in a simple EXIF description field
         if getattr(memory, "extracted_ocr_text", None):
@@ -101,8 +110,8 @@ def add_exif_data(image_path: Path, memory: Memory):
         if memory.latitude is not None and memory.longitude is not None:
             lat_ref = "N" if memory.latitude >= 0 else "S"
             lon_ref = "E" if memory.longitude >= 0 else "W"
-            lat_dms = _deg_to_rational(_to_deg(memory.latitude))
-            lon_dms = _deg_to_rational(_to_deg(memory.longitude))
+            lat_dms = _gps_rational(memory.latitude)
+            lon_dms = _gps_rational(memory.longitude)
 
             # GPSLatitudeRef: Direction (N=North, S=South)
             exif_dict["GPS"][piexif.GPSIFD.GPSLatitudeRef] = lat_ref.encode()
@@ -130,7 +139,7 @@ def add_exif_data(image_path: Path, memory: Memory):
 
 
     except Exception as e:
-        print(f"Failed to set EXIF data for {image_path.name}: {e}")
+        logger.warning("Failed to set EXIF data for %s: %s", image_path.name, e)
 
 
 def set_video_metadata(video_path: Path, memory: Memory):
@@ -215,10 +224,10 @@ def set_video_metadata(video_path: Path, memory: Memory):
 
 
     except Exception as e:
-        print(f"Failed to set video metadata for {video_path.name}: {e}")
+        logger.warning("Failed to set video metadata for %s: %s", video_path.name, e)
 
 
-def _apply_metadata_to_path(file_path: Path, memory: Memory, timestamp: float) -> None:
+def _apply_metadata_to_path(file_path: Path, memory: Memory, timestamp: float, has_prior_exif: bool = True) -> None:
     """Helper function to apply metadata to a single file path."""
     if not file_path.exists():
         return
@@ -228,7 +237,7 @@ def _apply_metadata_to_path(file_path: Path, memory: Memory, timestamp: float) -
         return
     
     if memory.media_type == MediaType.IMAGE:
-        add_exif_data(file_path, memory)
+        add_exif_data(file_path, memory, has_prior_exif)
     elif memory.media_type == MediaType.VIDEO and config.ffmpeg_available:
         set_video_metadata(file_path, memory)
 
@@ -243,9 +252,12 @@ def apply_metadata_and_timestamps(memory: Memory) -> None:
     # Use UTC timestamp for filesystem mtime/atime
     timestamp = memory.date.astimezone(timezone.utc).timestamp()
     
-    # Apply to path_with_overlay if set
+    # Apply to path_with_overlay if set. Images blended by PIL carry no EXIF; byte copies of the
+    # main image (no overlay, or a fully transparent one) keep Snapchat's EXIF and are loaded as usual
     if memory.path_with_overlay is not None:
-        _apply_metadata_to_path(memory.path_with_overlay, memory, timestamp)
+        _apply_metadata_to_path(
+            memory.path_with_overlay, memory, timestamp, has_prior_exif=not memory.overlay_reencoded
+        )
     
     # Apply to path_without_overlay if set
     if memory.path_without_overlay is not None:
@@ -5,14 +5,24 @@ Uses EasyOCR with GPU acceleration when available.
 
 import io
 import importlib
+import threading
 from functools import lru_cache
 from typing import Optional
 
 import numpy as np
-from PIL import Image, ImageOps
+from PIL import Image
 import easyocr
 
 
+# Overlays smaller than this, or with less grayscale variation, are treated as blank
+_MIN_OCR_PIXELS = 64 * 64
+_MIN_OCR_STD = 1.0
+
+# OCR runs in worker threads: one lock guards building the cached Reader (so models are
+# not downloaded/loaded twice) and every inference call on it
+_ocr_lock = threading.Lock()
+
+
 @lru_cache(maxsize=1)
 def _get_easyocr_reader():
     """Return a cached EasyOCR Reader, using GPU if CUDA is available.
@@ -28,22 +38,66 @@ def _get_easyocr_reader():
             use_gpu = False
     except Exception:
         use_gpu = False
-    return easyocr.Reader(["en"], gpu=use_gpu)
+    # quantize=True (EasyOCR's default) applies int8 dynamic quantization to the
+    # detector and recognizer when running on CPU; spelled out so it stays enabled
+    return easyocr.Reader(["en"], gpu=use_gpu, quantize=True)
+
 
+def _autocontrast(gray: np.ndarray) -> np.ndarray:
+    """Stretch a grayscale array to the full 0-255 range (same mapping as ImageOps.autocontrast)."""
+    lo, hi = int(gray.min()), int(gray.max())
+    if hi <= lo:
+        return gray
+    scale = 255.0 / (hi - lo)
+    lut = np.clip(np.arange(256) * scale - lo * scale, 0, 255).astype(np.uint8)
+    return lut[gray]
 
-def extract_overlay_text_easy(overlay_bytes: bytes) -> Optional[str]:
-    """Run OCR using EasyOCR on overlay image bytes (WebP/PNG).
 
-    Light preprocessing: grayscale + autocontrast.
-    Returns cleaned text or None if OCR fails or finds nothing.
+def _preprocess_overlay(overlay_bytes: bytes) -> Optional[np.ndarray]:
+    """Decode overlay bytes (WebP/PNG) to an autocontrasted grayscale array.
+
+    Returns None for overlays that cannot contain readable text (tiny or nearly
+    uniform, e.g. fully transparent), so the OCR model is not run on them.
     """
-    try:
-        img = Image.open(io.BytesIO(overlay_bytes))
-        gray = ImageOps.autocontrast(img.convert("L"))
-        reader = _get_easyocr_reader()
-        arr = np.array(gray)
-        results = reader.readtext(arr, detail=0)
-        cleaned = "\n".join(line.strip() for line in results if str(line).strip())
-        return cleaned or None
-    except Exception:
+    gray = np.asarray(Image.open(io.BytesIO(overlay_bytes)).convert("L"))
+    if gray.size < _MIN_OCR_PIXELS or gray.std() < _MIN_OCR_STD:
         return None
+    return _autocontrast(gray)
+
+
+def _join_lines(results) -> Optional[str]:
+    """Join EasyOCR text lines, dropping empty ones. Returns None if nothing is left."""
+    cleaned = "\n".join(line.strip() for line in results if str(line).strip())
+    return cleaned or None
+
+
+def extract_overlay_text_batch(overlays: list[bytes], batch_size: int = 16) -> list[Optional[str]]:
+    """Run OCR on several overlays with batched EasyOCR inference.
+
+    `readtext_batched` needs equally sized inputs, so overlays are grouped by
+    image size and each group runs as one batched call. Results keep input order;
+    entries are None when an overlay cannot be decoded, its batch fails, or no text is found.
+    """
+    texts: list[Optional[str]] = [None] * len(overlays)
+    groups: dict[tuple[int, ...], list[tuple[int, np.ndarray]]] = {}
+    for index, overlay_bytes in enumerate(overlays):
+        try:
+            arr = _preprocess_overlay(overlay_bytes)
+        except Exception:
+            continue
+        if arr is None:
+            continue
+        groups.setdefault(arr.shape, []).append((index, arr))
+
+    if not groups:
+        return texts
+    with _ocr_lock:
+        reader = _get_easyocr_reader()
+        for items in groups.values():
+            try:
+                results = reader.readtext_batched([arr for _, arr in items], detail=0, batch_size=batch_size)
+            except Exception:
+                continue
+            for (index, _), lines in zip(items, results):
+                texts[index] = _join_lines(lines)
+    return texts
@@ -0,0 +1,66 @@
+"""Coalesce overlay OCR requests into batched EasyOCR calls.
+
+ZIP processing submits overlays one at a time; a single background worker collects
+up to `BATCH_SIZE` of them (waiting at most `BATCH_WAIT` seconds for the batch to
+fill) and runs them through `extract_overlay_text_batch` in a worker thread.
+"""
+
+import asyncio
+from typing import Optional
+
+from .ocr import extract_overlay_text_batch
+
+BATCH_SIZE = 8
+BATCH_WAIT = 0.05
+
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+
+
+async def _run_batches(queue: asyncio.Queue) -> None:
+    """Pop overlays into batches, OCR each batch, and resolve the callers' futures."""
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await queue.get()]
+        deadline = loop.time() + BATCH_WAIT
+        while len(items) < BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(queue.get(), timeout))
+            except TimeoutError:
+                break
+
+        try:
+            texts = await asyncio.to_thread(extract_overlay_text_batch, [data for data, _ in items], BATCH_SIZE)
+        except Exception:
+            # Same contract as single-image OCR: failures yield no text
+            texts = [None] * len(items)
+        for (_, future), text in zip(items, texts):
+            if not future.done():
+                future.set_result(text)
+
+
+async def submit(overlay_bytes: bytes) -> Optional[str]:
+    """Queue overlay bytes for batched OCR and return the extracted text (or None)."""
+    global _queue, _worker
+    if _queue is None:
+        _queue = asyncio.Queue()
+        _worker = asyncio.create_task(_run_batches(_queue))
+    future = asyncio.get_running_loop().create_future()
+    await _queue.put((overlay_bytes, future))
+    return await future
+
+
+async def close() -> None:
+    """Stop the batching worker once all ZIPs are processed."""
+    global _queue, _worker
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+    _queue = None
+    _worker = None
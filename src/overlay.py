@@ -1,7 +1,10 @@
 """Image and video overlay merging functionality."""
 
 import asyncio
+import errno
 import io
+import os
+import shutil
 import tempfile
 from pathlib import Path
 from PIL import Image
@@ -10,26 +13,56 @@ from . import config
 from .memory import Memory
 
 
-def merge_image_overlay(output_path: Path, main_data: bytes, overlay_data: bytes | None, memory: Memory | None = None) -> None:
-    """Merge image with optional overlay using PIL."""
+def is_webp(buf: bytes) -> bool:
+    """Return True if `buf` starts with a RIFF/WEBP header (Snapchat overlays are often WebP named .png)."""
+    return len(buf) >= 12 and buf[:4] == b"RIFF" and buf[8:12] == b"WEBP"
+
+
+def merge_image_overlay(output_path: Path, main_path: Path, overlay_data: bytes | None, memory: Memory | None = None) -> bool:
+    """Merge image (read from `main_path`) with optional overlay using PIL.
+
+    Returns True if `output_path` was re-encoded by PIL (which drops any EXIF), False if
+    it is a byte copy of the main image.
+    """
     try:
-        with Image.open(io.BytesIO(main_data)).convert("RGBA") as main_img:
-            if overlay_data:
-                try:
-                    with Image.open(io.BytesIO(overlay_data)).convert("RGBA") as overlay_img:
-                        overlay_resized = overlay_img.resize(main_img.size, Image.LANCZOS)
-                        main_img.alpha_composite(overlay_resized)
-                except Exception as e:
-                    if memory:
-                        print(f"Failed to load overlay for {memory.get_filename(occurrence=memory.occurrence)}: {e}")
-                    else:
-                        print(f"Failed to load overlay image: {e}")
-                    memory.fix_paths_on_merge_failure(config.overlay_mode)
-                    memory.path_without_overlay.write_bytes(main_data)
-                    print(f"Saved version without overlay: {memory.path_without_overlay}")
-                    raise
-            merged_img = main_img.convert("RGB")
-            merged_img.save(output_path, "JPEG", quality=95, optimize=False)
+        if not overlay_data:
+            # Nothing to composite: keep the original encoded image instead of decoding/re-encoding it
+            shutil.copyfile(main_path, output_path)
+            return False
+        try:
+            overlay_img = Image.open(io.BytesIO(overlay_data)).convert("RGBA")
+        except Exception as e:
+            if memory:
+                print(f"Failed to load overlay for {memory.get_filename(occurrence=memory.occurrence)}: {e}")
+            else:
+                print(f"Failed to load overlay image: {e}")
+            memory.fix_paths_on_merge_failure(config.overlay_mode)
+            # In 'both' mode the main media was already extracted to the without-overlay path
+            if main_path != memory.path_without_overlay:
+                shutil.copyfile(main_path, memory.path_without_overlay)
+            print(f"Saved version without overlay: {memory.path_without_overlay}")
+            raise
+        with overlay_img:
+            alpha_min, alpha_max = overlay_img.getchannel("A").getextrema()
+            if alpha_max == 0:
+                # Fully transparent overlay: the merged image is the main image itself
+                shutil.copyfile(main_path, output_path)
+                return False
+            with Image.open(main_path) as main_src:
+                # JPEG mains already decode to RGB: blend into that buffer instead of an RGBA copy
+                main_img = main_src if main_src.mode == "RGB" else main_src.convert("RGB")
+                # Overlays usually match the main image already; Lanczos only when they don't
+                if overlay_img.size != main_img.size:
+                    overlay_img = overlay_img.resize(main_img.size, Image.LANCZOS)
+                if alpha_min == 255:
+                    # Fully opaque overlay covers the main image: plain copy, no blending
+                    main_img.paste(overlay_img)
+                else:
+                    # Pasting with the overlay's own alpha as mask gives the same pixels as
+                    # alpha_composite onto the opaque main image
+                    main_img.paste(overlay_img, (0, 0), overlay_img)
+                main_img.save(output_path, "JPEG", quality=95, optimize=False)
+        return True
     except Exception as e:
         if memory:
             print(f"Failed to process image {memory.get_filename(occurrence=memory.occurrence)}: {e}")
@@ -38,11 +71,19 @@ def merge_image_overlay(output_path: Path, main_data: bytes, overlay_data: bytes
         raise
 
 
-async def _try_ffmpeg_merge(
-    ffmpeg_path: str, main_path: Path, overlay_path: Path, merged_path: Path, overlay_bytes: bytes
-) -> bool:
-    """Attempt ffmpeg merge with given overlay bytes. Returns True if successful."""
-    overlay_path.write_bytes(overlay_bytes)
+def _replace_file(src: Path, dest: Path) -> None:
+    """Move `src` over `dest` with a rename, copying only across filesystems."""
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copyfile(src, dest)
+        src.unlink()
+
+
+async def _try_ffmpeg_merge(ffmpeg_path: str, main_path: Path, overlay_path: Path, merged_path: Path) -> bool:
+    """Attempt ffmpeg merge with the overlay file at `overlay_path`. Returns True if successful."""
     process = await asyncio.create_subprocess_exec(
         ffmpeg_path,
         "-y",
@@ -54,6 +95,9 @@ async def _try_ffmpeg_merge(
         "[1][0]scale2ref=w=iw:h=ih[overlay][base];[base][overlay]overlay=(W-w)/2:(H-h)/2",
         "-codec:a",
         "copy",
+        # One thread per process: concurrent merges already spread work across cores
+        "-threads",
+        "1",
         str(merged_path),
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
@@ -62,52 +106,73 @@ async def _try_ffmpeg_merge(
     return process.returncode == 0
 
 
+_ffmpeg_semaphore: asyncio.Semaphore | None = None
+
+
+def _get_ffmpeg_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore bounding concurrent ffmpeg merges (created after config is applied)."""
+    global _ffmpeg_semaphore
+    if _ffmpeg_semaphore is None:
+        _ffmpeg_semaphore = asyncio.Semaphore(max(1, config.ffmpeg_concurrency))
+    return _ffmpeg_semaphore
+
+
+async def _merge_video_with_ffmpeg(output_path: Path, main_path: Path, overlay_data: bytes, memory: Memory) -> None:
+    """Burn `overlay_data` into the video at `main_path` with ffmpeg, falling back to the main video on failure."""
+    # ffmpeg writes next to the destination so the result is renamed into place, not copied
+    merged_path = output_path.with_name(f".{output_path.stem}.merging{output_path.suffix}")
+
+    # Detect overlay format and apply correct extension; the file lives in the run's shared temp root
+    overlay_is_webp = is_webp(overlay_data)
+    fd, overlay_name = tempfile.mkstemp(suffix=".webp" if overlay_is_webp else ".png", dir=config.tmp_root)
+    os.close(fd)
+    overlay_path = Path(overlay_name)
+
+    try:
+        try:
+            # First attempt: try with original overlay
+            overlay_path.write_bytes(overlay_data)
+            if await _try_ffmpeg_merge(config.ffmpeg_path, main_path, overlay_path, merged_path):
+                _replace_file(merged_path, output_path)
+            else:
+                # Second attempt: try PIL re-encode fallback
+                print(f"ffmpeg merge failed for {memory.get_filename(has_overlay=True, occurrence=memory.occurrence)}, attempting PIL re-encode fix...")
+                try:
+                    # Re-save over the original overlay file to clean up corruption
+                    with Image.open(io.BytesIO(overlay_data)) as img:
+                        img.save(overlay_path, 'WEBP' if overlay_is_webp else 'PNG')
+                    
+                    # Retry merge with cleaned overlay
+                    if await _try_ffmpeg_merge(config.ffmpeg_path, main_path, overlay_path, merged_path):
+                        _replace_file(merged_path, output_path)
+                    else:
+                        raise RuntimeError("ffmpeg merge failed even with cleaned overlay")
+                except Exception as e:
+                    print(f"Warning: PIL re-encode fallback failed: {e}")
+                    raise
+        except Exception:
+            error_msg = "ffmpeg overlay merge failed"
+            print(f"{error_msg} for {memory.get_filename(has_overlay=True, occurrence=memory.occurrence)}")
+            memory.fix_paths_on_merge_failure(config.overlay_mode)
+            if main_path != memory.path_without_overlay:
+                shutil.copyfile(main_path, memory.path_without_overlay)
+            print(f"Saved version without overlay: {memory.path_without_overlay}")
+            raise RuntimeError(error_msg)
+    finally:
+        # Runs on cancellation (Ctrl-C) too, so no hidden partial output is left in the output folder
+        merged_path.unlink(missing_ok=True)
+        overlay_path.unlink(missing_ok=True)
+
+
 async def merge_video_overlay(
-    output_path: Path, main_data: bytes, overlay_data: bytes | None, memory: Memory
+    output_path: Path, main_path: Path, overlay_data: bytes | None, memory: Memory
 ) -> None:
-    """Merge video with optional overlay using ffmpeg."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        main_path = Path(tmpdir) / "main.mp4"
-        merged_path = Path(tmpdir) / "merged.mp4"
-        main_path.write_bytes(main_data)
-
-        if overlay_data:
-            # Detect overlay format and apply correct extension
-            is_webp = overlay_data.startswith(b'RIFF') and b'WEBP' in overlay_data[:12]
-            if is_webp:
-                overlay_path = Path(tmpdir) / "overlay.webp"
-            else:
-                overlay_path = Path(tmpdir) / "overlay.png"
-            
-            try:
-                # First attempt: try with original overlay
-                if await _try_ffmpeg_merge(config.ffmpeg_path, main_path, overlay_path, merged_path, overlay_data):
-                    output_path.write_bytes(merged_path.read_bytes())
-                else:
-                    # Second attempt: try PIL re-encode fallback
-                    print(f"ffmpeg merge failed for {memory.get_filename(has_overlay=True, occurrence=memory.occurrence)}, attempting PIL re-encode fix...")
-                    try:
-                        img = Image.open(io.BytesIO(overlay_data))
-                        # Re-save to clean up corruption
-                        with tempfile.NamedTemporaryFile(suffix='.webp' if is_webp else '.png', delete=False) as tmp:
-                            img.save(tmp.name, 'WEBP' if is_webp else 'PNG')
-                            cleaned_overlay_data = Path(tmp.name).read_bytes()
-                            Path(tmp.name).unlink()
-                        
-                        # Retry merge with cleaned overlay
-                        if await _try_ffmpeg_merge(config.ffmpeg_path, main_path, overlay_path, merged_path, cleaned_overlay_data):
-                            output_path.write_bytes(merged_path.read_bytes())
-                        else:
-                            raise RuntimeError("ffmpeg merge failed even with cleaned overlay")
-                    except Exception as e:
-                        print(f"Warning: PIL re-encode fallback failed: {e}")
-                        raise
-            except Exception:
-                error_msg = "ffmpeg overlay merge failed"
-                print(f"{error_msg} for {memory.get_filename(has_overlay=True, occurrence=memory.occurrence)}")
-                memory.fix_paths_on_merge_failure(config.overlay_mode)
-                memory.path_without_overlay.write_bytes(main_data)
-                print(f"Saved version without overlay: {memory.path_without_overlay}")
-                raise RuntimeError(error_msg)
-        else:
-            output_path.write_bytes(main_data)
+    """Merge video (read from `main_path`) with optional overlay using ffmpeg.
+
+    At most `config.ffmpeg_concurrency` merges run at once; downloads keep going meanwhile.
+    """
+    if not overlay_data:
+        shutil.copyfile(main_path, output_path)
+        return
+    async with _get_ffmpeg_semaphore():
+        await _merge_video_with_ffmpeg(output_path, main_path, overlay_data, memory)
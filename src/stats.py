@@ -1,12 +1,15 @@
 """Statistics tracking for downloads."""
 
-from pydantic import BaseModel
+import sys
+from dataclasses import dataclass
+
 from . import config
 from .config import OverlayMode
 
 
-class Stats(BaseModel):
-    """Track download statistics."""
+@dataclass(slots=True)
+class Stats:
+    """Track download statistics (plain slots dataclass: counters are bumped per memory)."""
     downloaded: int = 0
     skipped: int = 0
     failed: int = 0
@@ -29,30 +32,38 @@ class Stats(BaseModel):
         """Print comprehensive download statistics summary."""
         mb_per_sec = self.mb / elapsed_time if elapsed_time > 0 else 0
         
-        # Print comprehensive statistics
-        print(f"\n{'='*70}")
-        print("DOWNLOAD SUMMARY")
-        print(f"{'='*70}")
-        print(f"Downloaded: {self.downloaded} | Skipped: {self.skipped} | Failed: {self.failed}")
-        print(f"Total Size: {self.mb:.1f} MB @ {mb_per_sec:.2f} MB/s")
-        print(f"{'='*70}")
-        print("MEDIA BREAKDOWN")
-        print(f"{'='*70}")
-        print(f"Images:  {self.total_images:4d} total | {self.images_with_overlay:4d} with overlay | {self.images_without_overlay:4d} without overlay")
-        print(f"Videos:  {self.total_videos:4d} total | {self.videos_with_overlay:4d} with overlay | {self.videos_without_overlay:4d} without overlay")
-        print(f"{'='*70}")
-        print("DUPLICATE TIMESTAMPS")
-        print(f"{'='*70}")
-        print(f"Timestamps with multiple occurrences: {self.duplicate_timestamp_groups}")
+        # Build the whole summary first and write it in one call instead of one print per line
+        rule = "=" * 70
+        lines = [
+            f"\n{rule}",
+            "DOWNLOAD SUMMARY",
+            rule,
+            f"Downloaded: {self.downloaded} | Skipped: {self.skipped} | Failed: {self.failed}",
+            f"Total Size: {self.mb:.1f} MB @ {mb_per_sec:.2f} MB/s",
+            rule,
+            "MEDIA BREAKDOWN",
+            rule,
+            f"Images:  {self.total_images:4d} total | {self.images_with_overlay:4d} with overlay | {self.images_without_overlay:4d} without overlay",
+            f"Videos:  {self.total_videos:4d} total | {self.videos_with_overlay:4d} with overlay | {self.videos_without_overlay:4d} without overlay",
+            rule,
+            "DUPLICATE TIMESTAMPS",
+            rule,
+            f"Timestamps with multiple occurrences: {self.duplicate_timestamp_groups}",
+        ]
         if config.overlay_mode == OverlayMode.BOTH and (self.extra_images_without_overlay > 0 or self.extra_videos_without_overlay > 0):
-            print(f"{'='*70}")
-            print("BOTH MODE EXTRA COPIES")
-            print(f"{'='*70}")
-            print(f"Extra images (without overlay): {self.extra_images_without_overlay}")
-            print(f"Extra videos (without overlay): {self.extra_videos_without_overlay}")
+            lines += [
+                rule,
+                "BOTH MODE EXTRA COPIES",
+                rule,
+                f"Extra images (without overlay): {self.extra_images_without_overlay}",
+                f"Extra videos (without overlay): {self.extra_videos_without_overlay}",
+            ]
         if self.overlay_failed > 0:
-            print(f"{'='*70}")
-            print("OVERLAY FAILURES")
-            print(f"{'='*70}")
-            print(f"Overlay merge failed: {self.overlay_failed}")
-        print(f"{'='*70}")
+            lines += [
+                rule,
+                "OVERLAY FAILURES",
+                rule,
+                f"Overlay merge failed: {self.overlay_failed}",
+            ]
+        lines.append(rule)
+        sys.stdout.write("\n".join(lines) + "\n")
@@ -1,16 +1,71 @@
 """ZIP file processing, overlay merging, and overlay OCR."""
 
+import asyncio
 import io
+import os
+import shutil
+import tempfile
 import zipfile
 from pathlib import Path
 
-from .ocr import extract_overlay_text_easy
-
-from . import config
+from . import config, ocr_batcher
 from .config import OverlayMode, OverlayNaming
 from .memory import Memory, MediaType
 from .stats import Stats
-from .overlay import merge_image_overlay, merge_video_overlay
+from .overlay import is_webp, merge_image_overlay, merge_video_overlay
+
+
+def _extract_member(zf: zipfile.ZipFile, name: str, dest: Path) -> None:
+    """Stream a ZIP member to `dest` in 1 MB chunks without holding it in memory.
+
+    The member is written to a hidden sibling and renamed into place only once it is fully
+    inflated and its CRC checked, so a corrupt member never leaves a truncated file at `dest`.
+    """
+    part_path = dest.with_name(f".{dest.name}.part")
+    try:
+        with zf.open(name) as src, part_path.open("wb") as dst:
+            shutil.copyfileobj(src, dst, length=1 << 20)
+        os.replace(part_path, dest)
+    finally:
+        part_path.unlink(missing_ok=True)
+
+
+# Merge function per media type, and whether it must be awaited
+_MERGE = {
+    MediaType.IMAGE: (merge_image_overlay, False),
+    MediaType.VIDEO: (merge_video_overlay, True),
+}
+
+
+async def _run_merge(merge, is_async: bool, output_path: Path, main_path: Path, overlay_data: bytes | None, memory: Memory) -> None:
+    """Call a `_MERGE` function: await it when it is async, else run it in a worker thread.
+
+    Records on the memory whether the merged output was re-encoded (image merges report it).
+    """
+    if is_async:
+        result = await merge(output_path, main_path, overlay_data, memory)
+    else:
+        result = await asyncio.to_thread(merge, output_path, main_path, overlay_data, memory)
+    memory.overlay_reencoded = bool(result)
+
+
+def _count_merged(stats: Stats, is_image: bool) -> None:
+    """Count one merged (with overlay) image or video."""
+    if is_image:
+        stats.total_images += 1
+        stats.images_with_overlay += 1
+    else:
+        stats.total_videos += 1
+        stats.videos_with_overlay += 1
+
+
+def _save_raw_zip(zip_content: bytes, error_dir: Path, reason: Exception) -> None:
+    """Save the unextracted ZIP next to `error_dir` when its members cannot be salvaged."""
+    print(f"Could not extract ZIP contents, saving raw ZIP file instead: {reason}")
+    error_zip_path = error_dir.parent / f"{error_dir.name}.zip"
+    error_zip_path.write_bytes(zip_content)
+    print(f"  Saved ZIP ({len(zip_content)} bytes) to: {error_zip_path.relative_to(config.output_dir)}")
+
 
 async def process_zip_with_overlays(output_path: Path, zip_content: bytes, memory: Memory, stats: Stats) -> None:
     """Extract and merge media from ZIP file with overlays.
@@ -21,53 +76,56 @@ async def process_zip_with_overlays(output_path: Path, zip_content: bytes, memor
     
     If merge fails, saves the unextracted ZIP to an error folder for manual inspection.
     """
+    with_name = memory.get_filename(has_overlay=True, occurrence=memory.occurrence)
+    without_name = memory.get_filename(has_overlay=False, occurrence=memory.occurrence)
+    zf = None
     try:
-        with zipfile.ZipFile(io.BytesIO(zip_content)) as zf:
-            files = zf.namelist()
-            main_file = next((f for f in files if "-main" in f), None)
-            overlay_file = next((f for f in files if "-overlay" in f), None)
+        # Kept open until the end so a failed merge can salvage members from the parsed archive
+        zf = zipfile.ZipFile(io.BytesIO(zip_content))
+        try:
+            merge, is_async = _MERGE[memory.media_type]
+        except KeyError:
+            raise ValueError(f"Unsupported media type: {memory.media_type}") from None
+        is_image = memory.media_type == MediaType.IMAGE
 
-            if not main_file:
-                raise ValueError("No main media file found in ZIP.")
+        files = zf.namelist()
+        main_file = next((f for f in files if "-main" in f), None)
+        overlay_file = next((f for f in files if "-overlay" in f), None)
 
-            main_data = zf.read(main_file)
-            overlay_data = zf.read(overlay_file) if overlay_file else None
+        if not main_file:
+            raise ValueError("No main media file found in ZIP.")
 
-            # If overlay exists and OCR is enabled, extract caption text (WebP/PNG)
-            if overlay_data and config.ocr_metadata:
-                memory.extracted_ocr_text = extract_overlay_text_easy(overlay_data)
+        # ZIP inflation runs in worker threads (zlib releases the GIL) so the event loop keeps
+        # serving other downloads and ffmpeg merges meanwhile
+        overlay_data = await asyncio.to_thread(zf.read, overlay_file) if overlay_file else None
 
+        # If overlay exists and OCR is enabled, extract caption text (WebP/PNG) through the
+        # batching OCR worker while the merge runs; the result is collected before returning
+        ocr_task = None
+        if overlay_data and config.ocr_metadata:
+            ocr_task = asyncio.create_task(ocr_batcher.submit(overlay_data))
+
+        try:
             if config.overlay_mode == OverlayMode.BOTH:
                 if config.overlay_naming == OverlayNaming.SINGLE_FOLDER:
-                    overlay_memory_path = config.output_dir / memory.get_filename(has_overlay=True, occurrence=memory.occurrence)
-                    no_overlay_memory_path = config.output_dir / memory.get_filename(has_overlay=False, occurrence=memory.occurrence)
+                    overlay_memory_path = config.output_dir / with_name
+                    no_overlay_memory_path = config.output_dir / without_name
                 elif config.overlay_naming == OverlayNaming.SEPARATE_FOLDERS:
-                    overlay_dir = config.output_dir / config.WITH_OVERLAYS_DIR
-                    no_overlay_dir = config.output_dir / config.WITHOUT_OVERLAYS_DIR
-                    overlay_memory_path = overlay_dir / memory.get_filename(has_overlay=True, occurrence=memory.occurrence)
-                    no_overlay_memory_path = no_overlay_dir / memory.get_filename(has_overlay=False, occurrence=memory.occurrence)
-                # Save version with overlays
+                    overlay_memory_path = config.output_dir / config.WITH_OVERLAYS_DIR / with_name
+                    no_overlay_memory_path = config.output_dir / config.WITHOUT_OVERLAYS_DIR / without_name
+                # Version without overlays is the main media itself: stream it straight to its
+                # final path, then merge from that file. Paths are only recorded once it exists.
+                await asyncio.to_thread(_extract_member, zf, main_file, no_overlay_memory_path)
                 memory.path_with_overlay = overlay_memory_path
                 memory.path_without_overlay = no_overlay_memory_path
-                if memory.media_type == MediaType.IMAGE:
-                    merge_image_overlay(overlay_memory_path, main_data, overlay_data, memory)
-                    stats.total_images += 1
-                    stats.images_with_overlay += 1
-                elif memory.media_type == MediaType.VIDEO:
-                    await merge_video_overlay(overlay_memory_path, main_data, overlay_data, memory)
-                    stats.total_videos += 1
-                    stats.videos_with_overlay += 1
-                else:
-                    raise ValueError(f"Unsupported media type: {memory.media_type}")
-
-                # Save version without overlays (main only - no merge needed)
-                no_overlay_memory_path.write_bytes(main_data)
+                await _run_merge(merge, is_async, overlay_memory_path, no_overlay_memory_path, overlay_data, memory)
+                _count_merged(stats, is_image)
                 # Count the extra copy
-                if memory.media_type == MediaType.IMAGE:
+                if is_image:
                     stats.extra_images_without_overlay += 1
                 else:
                     stats.extra_videos_without_overlay += 1
-                
+            
                 # Optionally save a copy of the overlay file to overlays folder
                 if config.save_overlays_only and overlay_data:
                     overlays_dir = config.output_dir / config.overlays_dir
@@ -76,45 +134,66 @@ async def process_zip_with_overlays(output_path: Path, zip_content: bytes, memor
                     overlay_copy_path.write_bytes(overlay_data)
             else:
                 # 'with' mode: save only merged version with overlays to output_path
-                memory_path = output_path / memory.get_filename(has_overlay=True, occurrence=memory.occurrence)
-                memory.path_with_overlay = memory_path
-                if memory.media_type == MediaType.IMAGE:
-                    merge_image_overlay(memory_path, main_data, overlay_data, memory)
-                    stats.total_images += 1
-                    stats.images_with_overlay += 1
-                elif memory.media_type == MediaType.VIDEO:
-                    await merge_video_overlay(memory_path, main_data, overlay_data, memory)
-                    stats.total_videos += 1
-                    stats.videos_with_overlay += 1
+                memory_path = output_path / with_name
+                if not overlay_data:
+                    # Nothing to merge: stream the main media straight to its final path (renamed
+                    # into place only when complete) and record the path once it exists
+                    await asyncio.to_thread(_extract_member, zf, main_file, memory_path)
+                    memory.path_with_overlay = memory_path
                 else:
-                    raise ValueError(f"Unsupported media type: {memory.media_type}")
+                    memory.path_with_overlay = memory_path
+                    # Stream the main media (possibly a large video) to a file in the run's shared
+                    # temp root instead of reading it into memory
+                    fd, main_name = tempfile.mkstemp(suffix=Path(main_file).suffix, dir=config.tmp_root)
+                    os.close(fd)
+                    main_path = Path(main_name)
+                    try:
+                        await asyncio.to_thread(_extract_member, zf, main_file, main_path)
+                        await _run_merge(merge, is_async, memory_path, main_path, overlay_data, memory)
+                    finally:
+                        main_path.unlink(missing_ok=True)
+                _count_merged(stats, is_image)
+        finally:
+            if ocr_task is not None:
+                memory.extracted_ocr_text = await ocr_task
     except Exception as e:
         stats.overlay_failed += 1
-        print(f"Error processing ZIP for {memory.get_filename(occurrence=memory.occurrence)}: {e}")
+        print(f"Error processing ZIP for {without_name}: {e}")
         print("Saving extracted files to error folder for manual inspection.")
         
         # Extract and save files to error subfolder
-        error_dir = config.output_dir / "error_zips" / memory.get_filename(occurrence=memory.occurrence).rsplit('.', 1)[0]
+        error_dir = config.output_dir / "error_zips" / without_name.rsplit('.', 1)[0]
         error_dir.mkdir(parents=True, exist_ok=True)
         
+        if zf is None:
+            # The archive itself could not be opened, so there is nothing to extract
+            _save_raw_zip(zip_content, error_dir, e)
+            return
         try:
-            with zipfile.ZipFile(io.BytesIO(zip_content)) as zf:
-                for file_info in zf.filelist:
-                    file_data = zf.read(file_info.filename)
-                    
-                    # Check if this is an overlay file that's actually WebP
+            for file_info in zf.filelist:
+                with zf.open(file_info) as src:
+                    # Peek at the header to check if this is an overlay file that's actually WebP
+                    head = src.read(12)
                     filename_to_save = file_info.filename
                     if "-overlay" in file_info.filename and file_info.filename.endswith('.png'):
-                        if file_data.startswith(b'RIFF') and b'WEBP' in file_data[:12]:
+                        if is_webp(head):
                             # Rename from .png to .webp
                             filename_to_save = file_info.filename.replace('.png', '.webp')
                     
                     error_file_path = error_dir / filename_to_save
                     error_file_path.parent.mkdir(parents=True, exist_ok=True)
-                    error_file_path.write_bytes(file_data)
-                    print(f"  Saved: {error_file_path.relative_to(config.output_dir)}")
+                    # Write the peeked header, then stream the rest of the member; a member that
+                    # fails its CRC mid-stream must not be left behind looking salvaged
+                    try:
+                        with error_file_path.open("wb") as dst:
+                            dst.write(head)
+                            shutil.copyfileobj(src, dst, length=1 << 20)
+                    except Exception:
+                        error_file_path.unlink(missing_ok=True)
+                        raise
+                print(f"  Saved: {error_file_path.relative_to(config.output_dir)}")
         except Exception as extract_error:
-            print(f"Could not extract ZIP contents, saving raw ZIP file instead: {extract_error}")
-            error_zip_path = error_dir.parent / f"{memory.get_filename(occurrence=memory.occurrence).rsplit('.', 1)[0]}.zip"
-            error_zip_path.write_bytes(zip_content)
-            print(f"  Saved ZIP ({len(zip_content)} bytes) to: {error_zip_path.relative_to(config.output_dir)}")
+            _save_raw_zip(zip_content, error_dir, extract_error)
+    finally:
+        if zf is not None:
+            zf.close()